@@ -1,4 +1,5 @@
 import argparse
+import itertools
 import time
 import os
 from relay_sync import RelaySyncer
@@ -17,13 +18,18 @@ def parse_arguments():
     return parser.parse_args()
 
 def get_pubkeys_from_file(filename="matching_nhex.txt"):
+    """Yield unique pubkeys in file order, so fetching can start before the whole file is read"""
+    seen = set()
     try:
         full_path = os.path.join(SCRIPT_DIR, filename)
         with open(full_path, "r") as file:
-            return [line.strip() for line in file if line.strip()]
+            for line in file:
+                pubkey = line.strip()
+                if pubkey and pubkey not in seen:
+                    seen.add(pubkey)
+                    yield pubkey
     except FileNotFoundError:
         print(f"No pubkeys found in {filename}.")
-        return []
 
 def main():
     start_time = time.time()
@@ -33,12 +39,16 @@ def main():
         input_relay=RELAY_URL,
         output_relay=OUTPUT_RELAY,
         timestamp_file=LAST_RUN_FILE,
-        quiet_mode=args.quiet
+        quiet_mode=args.quiet,
+        # sync_fediverse_to_nos.py copies the same authors to this relay
+        skip_existing=True
     )
 
     pubkeys = get_pubkeys_from_file()
-    if not pubkeys:
+    first_pubkey = next(pubkeys, None)
+    if first_pubkey is None:
         return
+    pubkeys = itertools.chain([first_pubkey], pubkeys)
 
     if not args.quiet:
         print("Fetching and publishing recent events from Nostr relay...")
@@ -46,7 +56,7 @@ def main():
     successful_syncs = syncer.fetch_and_publish_events(pubkeys)
 
     duration = time.time() - start_time
-    print(f"- Number of Mastodon users fetched: {len(pubkeys)}")
+    print(f"- Number of Mastodon users fetched: {syncer.pubkey_count}")
     print(f"- Number of notes copied to relay.nos.social: {successful_syncs}")
     print(f"- Duration: {duration:.1f} seconds")
 
@@ -8,14 +8,17 @@ further use or analysis.
 
 import json
 import os
-from websocket import create_connection
 import csv
 import time as time_module
-from datetime import datetime, timedelta, time as datetime_time
+from datetime import datetime, time as datetime_time
 import traceback
-import math
+import re
 import argparse
+import atexit
 import sys
+import fcntl
+from functools import lru_cache
+from relay_sync import json_loads, open_connection
 
 # Get the directory where the script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -25,6 +28,23 @@ RELAY_URL = "wss://relay.mostr.pub"
 TARGET_IDENTIFIER = "brid.gy_at_bsky"
 OUTPUT_FILE = os.path.join(SCRIPT_DIR, "matching_nhex.txt")
 TIMESTAMP_FILE = os.path.join(SCRIPT_DIR, "last_ran_timestamp.txt")
+WINDOW_SUBSCRIPTIONS = 8  # Time slices requested concurrently on the relay connection
+EVENT_LIMIT = 500  # The relay truncates a slice at this many events
+TARGET_EVENTS = 200  # Events per slice the adaptive time gap aims for
+MIN_TIME_GAP = 60  # Seconds
+MAX_TIME_GAP = 30 * 24 * 3600
+RECV_TIMEOUT = 60  # Seconds without a frame before the relay is considered gone
+REQUEST_RATE = 5  # Tokens per second refilled into the request bucket; one REQ costs one token
+REQUEST_BURST = WINDOW_SUBSCRIPTIONS  # Tokens the bucket can hold, so a quiet round is sent at once
+EVENTS_PER_TOKEN = EVENT_LIMIT  # Received events also drain the bucket, a full slice costing one token
+# Top-level "id" of a raw EVENT frame; quotes inside content are escaped so it cannot match there
+EVENT_ID_PATTERN = re.compile(rb'"id"\s*:\s*"([0-9a-f]{64})"')
+# Outgoing frames only vary in integers and our own subscription ids, so they are
+# formatted from templates instead of serialised
+REQ_TEMPLATE = b'["REQ","w%d",{"kinds":[0],"since":%d,"until":%d}]'
+CLOSE_TEMPLATE = b'["CLOSE","%s"]'
+# "nip05" string value inside kind: 0 content, without escape sequences
+NIP05_PATTERN = re.compile(r'"nip05"\s*:\s*"([^"\\]*)"')
 
 # Load blocklist domains from the CSV file
 def load_blocklist(file_path):
@@ -33,17 +53,50 @@ def load_blocklist(file_path):
     with open(full_path, newline='') as csvfile:
         reader = csv.reader(csvfile)
         for row in reader:
-            domain = row[0]
+            # nip05 domains are lowercased before lookup, so mixed-case entries can match
+            domain = row[0].lower()
             blocklist.add(domain)
-    return blocklist
-
-# Extract domain from nip05 and check against blocklist
-def is_domain_blocked(nip05, blocklist):
-    if "@" in nip05:
-        domain = nip05.split("@")[1]
-        domain = domain.replace("-", ".")
-        return domain in blocklist
-    return False
+    return frozenset(blocklist)
+
+# With msgspec installed, kind: 0 content is decoded straight into a one-field struct,
+# skipping every other profile field instead of building a dict
+try:
+    import msgspec
+
+    class NipOnly(msgspec.Struct):
+        nip05: str = ""
+
+    nip05_decoder = msgspec.json.Decoder(NipOnly)
+except ImportError:
+    msgspec = None
+
+# Extract nip05 from kind: 0 content, "" if missing and None if the content is not valid JSON.
+# Profiles are republished unchanged across windows, so identical content is parsed once.
+@lru_cache(maxsize=8192)
+def parse_nip05(content):
+    # Most profiles carry a plain nip05 string that can be read without decoding the rest.
+    # Only trusted with one "nip05" key and no nested object, where it must be the top-level
+    # key a decode would return; duplicate keys decode to the last one
+    if content.count('"nip05"') == 1 and content.count("{") == 1:
+        match = NIP05_PATTERN.search(content)
+        if match:
+            return match.group(1)
+    if msgspec is not None:
+        try:
+            return nip05_decoder.decode(content).nip05
+        except msgspec.ValidationError:
+            # Valid JSON of an unexpected shape, handled by the generic path below
+            pass
+        except msgspec.DecodeError:
+            return None
+    try:
+        content_dict = json_loads(content)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(content_dict, dict):
+        return ""
+    nip05 = content_dict.get("nip05", "")
+    return nip05 if isinstance(nip05, str) else ""
 
 # Read the last successful timestamp from a file
 def read_last_successful_timestamp():
@@ -81,147 +134,234 @@ def is_tty():
     return sys.stdout.isatty()
 
 # Fetch kind: 0 metadata events from the relay
-def fetch_metadata(blocklist, cron_mode=False):
+def fetch_metadata(blocklist, cron_mode=False, known_pubkeys=None, pubkeys=None):
     start_time = time_module.time()
-    pubkeys = set()
+    blocked = blocklist if isinstance(blocklist, frozenset) else frozenset(blocklist)
+    if known_pubkeys is None:
+        known_pubkeys = read_existing_pubkeys()
+    if pubkeys is None:
+        pubkeys = set()
+    # A truncated slice is retried from its start, so later rounds can cover events of
+    # earlier ones. Each round's ids are kept, with the end of its time range, until the
+    # sweep has moved past that end, instead of for the whole run
     processed_event_ids = set()
+    earlier_event_ids = []
+    processed_count = 0
     blocked_count = 0
     loop_counter = 0
-    growth_factor = 0
-    time_gap = timedelta(minutes=20)
-
-    # Use the last successful timestamp if available
+    tokens = float(REQUEST_BURST)
+    refilled_at = time_module.monotonic()
+    time_gap = 20 * 60
+    # Lowered when the relay refuses subscriptions beyond its own limit
+    window = WINDOW_SUBSCRIPTIONS
+
+    # Use the last successful timestamp if available. The sweep itself works on
+    # unix seconds; datetimes are only built for printing
     start_date = read_last_successful_timestamp() or datetime(2022, 5, 6)
+    start_timestamp = int(start_date.timestamp())
     current_time = datetime.now()
+    now_timestamp = int(current_time.timestamp())
 
-    try:
-        ws = create_connection(RELAY_URL)
-
-        while start_date < current_time:
-            loop_counter += 1
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int((start_date + time_gap).timestamp())
-            readable_start = start_date.strftime('%Y-%m-%d %H:%M:%S')
-
-            if not cron_mode and is_tty():
-                print(f"Loop {loop_counter}: Requesting events from {readable_start}")
-
-            # Subscribe to all kind: 0 events with a time filter
-            request = json.dumps([
-                "REQ",
-                "metadata_subscription",
-                {"kinds": [0], "since": start_timestamp, "until": end_timestamp}
-            ])
-            ws.send(request)
-
-            new_events_processed = False
-            event_count = 0
-            latest_event_timestamp = start_timestamp
-            first_event_timestamp = None
-
-            while True:
-                response = ws.recv()
-                data = json.loads(response)
-
-                if data[0] == "EOSE":
-                    if not cron_mode and is_tty():
-                        print(f"Found: {event_count} profiles of {len(pubkeys)}")
-                    break
+    # New pubkeys are appended as they are found and flushed after every round, so the
+    # file never needs rewriting
+    append_fp = open(OUTPUT_FILE, "a", buffering=1 << 20)
 
-                if data[0] == "EVENT" and "content" in data[2]:
-                    event = data[2]
-                    event_id = event.get("id")
-
-                    if event_id not in processed_event_ids:
-                        processed_event_ids.add(event_id)
-                        content = event.get("content", "")
-                        new_events_processed = True
-                        event_count += 1
-
-                        if first_event_timestamp is None:
-                            first_event_timestamp = event.get("created_at", start_timestamp)
-
-                        try:
-                            if content:
-                                content_dict = json.loads(content)
-                                nip05 = content_dict.get("nip05", "")
-
-                                if not nip05:
-                                    continue
-
-                                if not is_domain_blocked(nip05, blocklist):
-                                    pubkeys.add(event["pubkey"])
-                                else:
-                                    print(f"Domain blocked: {nip05}")
-
-                                event_timestamp = event.get("created_at", start_timestamp)
-                                latest_event_timestamp = max(latest_event_timestamp, event_timestamp)
-                        except json.JSONDecodeError:
-                            print("Content is not valid JSON.")
-
-            if event_count >= 500:
-                # Too many events, step back
-                start_date = datetime.fromtimestamp(start_timestamp) - timedelta(minutes=5)
-                time_gap = timedelta(minutes=10)  # Reset to smaller gap
-                growth_factor = 0
-            elif event_count > 150:
-                # Good number of events
-                start_date = datetime.fromtimestamp(end_timestamp)
-                time_gap = timedelta(minutes=20)
-            elif event_count > 50:
-                # Decent number of events
-                start_date = datetime.fromtimestamp(end_timestamp)
-                time_gap = timedelta(minutes=60)
-                growth_factor += 1
+    try:
+        ws = open_connection(RELAY_URL, timeout=RECV_TIMEOUT)
+        # The per-frame loop is interpreter bound, so resolve these lookups once
+        recv_data = ws.recv_data
+        find_event_id = EVENT_ID_PATTERN.search
+        show_progress = not cron_mode and is_tty()
+
+        while start_timestamp < now_timestamp:
+            # Split the next stretch of time into slices and request them all at once
+            # on the one connection, each under its own subscription id
+            slice_start = start_timestamp
+            slices = {}
+            while len(slices) < window and slice_start < now_timestamp:
+                loop_counter += 1
+                sub_id = f"w{loop_counter}"
+                # The last slice stops at the start of the run, which is as far as it is complete
+                slice_end = min(slice_start + time_gap, now_timestamp)
+                slices[sub_id] = (slice_start, slice_end)
+                if show_progress:
+                    readable_start = datetime.fromtimestamp(slice_start).strftime('%Y-%m-%d %H:%M:%S')
+                    print(f"Loop {loop_counter}: Requesting events from {readable_start}")
+
+                # Token bucket: only wait once requests and the events they return
+                # have used up the burst
+                now = time_module.monotonic()
+                tokens = min(REQUEST_BURST, tokens + (now - refilled_at) * REQUEST_RATE)
+                refilled_at = now
+                if tokens < 1:
+                    time_module.sleep((1 - tokens) / REQUEST_RATE)
+                    tokens = 1
+                    refilled_at = time_module.monotonic()
+                tokens -= 1
+
+                # Subscribe to all kind: 0 events with a time filter
+                ws.send(REQ_TEMPLATE % (loop_counter, slice_start, slice_end))
+                slice_start = slice_end
+
+            event_counts = dict.fromkeys(slices, 0)
+            outstanding = len(slices)
+            # A relay may still send CLOSED for a slice after its EOSE, e.g. acknowledging our CLOSE
+            finished = set()
+            refused = set()
+
+            while outstanding:
+                # Keep the raw frame as bytes so it can be searched before any content parsing
+                _, response = recv_data()
+
+                if not response.startswith(b'["EVENT"'):
+                    data = json_loads(response)
+                    if data[0] not in ("EOSE", "CLOSED") or data[1] not in slices or data[1] in finished:
+                        continue
+                    finished.add(data[1])
+                    outstanding -= 1
+                    if data[0] == "EOSE":
+                        ws.send(CLOSE_TEMPLATE % data[1].encode())
+                        if show_progress:
+                            print(f"Found: {event_counts[data[1]]} profiles of {len(pubkeys)}")
+                    else:
+                        # The relay refused or ended the subscription; the slice is retried next round
+                        refused.add(data[1])
+                        print(f"Subscription for slice {data[1]} closed by relay: {data[2:]}")
+                    continue
+
+                # Subscription id is the second string in the frame
+                sub_start = response.index(b'"', 8) + 1
+                sub_id = response[sub_start:response.index(b'"', sub_start)].decode()
+                if sub_id in slices:
+                    event_counts[sub_id] += 1
+
+                match = find_event_id(response)
+                if match is None:
+                    continue
+                # First 64 bits of the id as an int: a fraction of the memory of the hex string
+                event_key = int(match.group(1)[:16], 16)
+                if event_key in processed_event_ids or any(event_key in ids for _, ids in earlier_event_ids):
+                    continue
+                processed_event_ids.add(event_key)
+                processed_count += 1
+
+                # nip05 sits inside the escaped content string, so look for the bare key
+                # and only parse frames that can carry one
+                if b"nip05" not in response:
+                    continue
+
+                event = json_loads(response)[2]
+                content = event.get("content", "")
+
+                if not content:
+                    continue
+
+                nip05 = parse_nip05(content)
+                if nip05 is None:
+                    print("Content is not valid JSON.")
+                    continue
+                if not nip05:
+                    continue
+
+                # Check the nip05 domain and each of its parent domains against the blocklist.
+                # A "-" may also stand in for a "." of the domain; that form only matches whole
+                at = nip05.rfind("@")
+                if at >= 0:
+                    domain = nip05[at + 1:].lower()
+                    is_blocked = "-" in domain and domain.replace("-", ".") in blocked
+                    while domain and not is_blocked:
+                        is_blocked = domain in blocked
+                        domain = domain.partition(".")[2]
+                    if is_blocked:
+                        blocked_count += 1
+                        print(f"Domain blocked: {nip05}")
+                        continue
+                pubkey = event["pubkey"]
+                pubkeys.add(pubkey)
+                pubkey_key = bytes.fromhex(pubkey)
+                if pubkey_key not in known_pubkeys:
+                    known_pubkeys.add(pubkey_key)
+                    append_fp.write(pubkey + "\n")
+
+            tokens -= sum(event_counts.values()) / EVENTS_PER_TOKEN
+
+            # Persist this round's pubkeys before the timestamp moves past them
+            append_fp.flush()
+            earlier_event_ids.append((slice_start, processed_event_ids))
+            processed_event_ids = set()
+
+            # Everything before the first truncated slice is complete; resume from there
+            truncated = next((sub_id for sub_id, count in event_counts.items() if count >= EVENT_LIMIT), None)
+            if truncated is not None and time_gap > MIN_TIME_GAP:
+                # Too many events, retry that slice with a smaller gap
+                completed_until = slices[truncated][0]
+                event_count = event_counts[truncated]
             else:
-                # Too few events, increase time gap
-                start_date = datetime.fromtimestamp(end_timestamp)
-                time_gap = max(timedelta(minutes=10), time_gap * 2)
-
-            save_pubkeys_to_file(pubkeys)
+                completed_until = slice_start
+                event_count = max(event_counts.values())
+
+            # Nothing from the first refused slice on is complete either
+            first_refused = next((sub_id for sub_id in slices if sub_id in refused), None)
+            if first_refused is not None:
+                completed_until = min(completed_until, slices[first_refused][0])
+                if window == 1:
+                    print("Relay refused a single subscription, stopping the sweep")
+                    break
+                window = max(1, window // 2)
 
-            if event_count < 500:
-                # Only update timestamp if we didn't get too many events
-                update_last_successful_timestamp(end_timestamp)
+            # Scale the gap so the busiest slice would have held about TARGET_EVENTS events,
+            # growing at most 4x per round
+            factor = min(TARGET_EVENTS / max(event_count, 1), 4)
+            time_gap = max(MIN_TIME_GAP, min(MAX_TIME_GAP, int(time_gap * factor)))
 
-            time_module.sleep(1)
+            if completed_until > start_timestamp:
+                update_last_successful_timestamp(completed_until)
+            start_timestamp = completed_until
+            # Slices include both ends, so events at start_timestamp itself can come again
+            earlier_event_ids = [(until, ids) for until, ids in earlier_event_ids if until >= start_timestamp]
 
         ws.close()
     except Exception as e:
         if not cron_mode and is_tty():
             print(f"Error fetching metadata: {e}")
             traceback.print_exc()
+    finally:
+        append_fp.close()
 
     duration = time_module.time() - start_time
 
+    start_date = datetime.fromtimestamp(start_timestamp)
     print(f"- Time range: {start_date.strftime('%Y-%m-%d %H:%M:%S')} to {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"- Total profiles processed: {len(processed_event_ids)}")
+    print(f"- Total profiles processed: {processed_count}")
     print(f"- New profiles added: {len(pubkeys)}")
     print(f"- Profiles blocked: {blocked_count}")
     print(f"- Duration: {duration:.1f} seconds")
 
     return pubkeys
 
-# Save unique nhex values to the file
-def save_pubkeys_to_file(pubkeys):
+# Read the nhex values already stored in the output file, as raw 32-byte keys that take
+# half the memory of the hex strings
+def read_existing_pubkeys():
     existing_pubkeys = set()
 
     if os.path.exists(OUTPUT_FILE):
         with open(OUTPUT_FILE, "r") as f:
-            for line in f:
-                existing_pubkeys.add(line.strip())
+            for pubkey in f.read().split():
+                try:
+                    existing_pubkeys.add(bytes.fromhex(pubkey))
+                except ValueError:
+                    pass
 
-    all_pubkeys = existing_pubkeys.union(pubkeys)
+    return existing_pubkeys
 
-    new_pubkeys_count = len(pubkeys - existing_pubkeys)
-    pre_existing_pubkeys_count = len(existing_pubkeys)
-
-    with open(OUTPUT_FILE, "w") as f:
-        for pubkey in all_pubkeys:
-            f.write(pubkey + "\n")
+# Report the size of the output file. Runs hold a lock on it, so only one appends at a time
+# and it stays free of duplicates. known_pubkeys is the set fetch_metadata adds new pubkeys to
+def report_pubkey_totals(known_pubkeys, pre_existing_pubkeys_count):
+    all_pubkeys_count = len(known_pubkeys)
+    new_pubkeys_count = all_pubkeys_count - pre_existing_pubkeys_count
 
     if not is_tty():
-        print(f"- Total profiles in database: {len(all_pubkeys)}")
+        print(f"- Total profiles in database: {all_pubkeys_count}")
         print(f"- New profiles this run: {new_pubkeys_count}")
         print(f"- Pre-existing profiles: {pre_existing_pubkeys_count}")
 
@@ -237,9 +377,22 @@ def main():
     current_time = datetime.now().time()
 
     if allowed_start_time <= current_time <= allowed_end_time:
+        # Cron starts a run every minute; a run still going would append the same new pubkeys.
+        # The lock is held until the process exits.
+        lock_fp = open(OUTPUT_FILE, "a")
+        try:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not args.cron and is_tty():
+                print("Another run is still in progress.")
+            lock_fp.close()
+            return
+
         blocklist = load_blocklist("_unified_tier0_blocklist.csv")
-        pubkeys = fetch_metadata(blocklist, args.cron)
-        save_pubkeys_to_file(pubkeys)
+        known_pubkeys = read_existing_pubkeys()
+        # Report totals on the way out, even if the sweep is interrupted
+        atexit.register(report_pubkey_totals, known_pubkeys, len(known_pubkeys))
+        fetch_metadata(blocklist, args.cron, known_pubkeys)
     else:
         if not args.cron and is_tty():
             print("The script can only run between 9:00 AM and 5:00 PM.")
@@ -1,16 +1,18 @@
-import json
-from websocket import create_connection
+from relay_sync import DEFAULT_POOL, json_loads, json_dumps
 import os
 from datetime import datetime
 import time
 from tqdm import tqdm
 import random
 import argparse
+import mmap
 
 # Relay URLs (same as sync script)
 RELAY_URL = "wss://relay.mostr.pub"
 NEWS_URL = "wss://relay.nos.social"
 MATCHING_NHEX_FILE = "matching_nhex.txt"
+CHECK_BATCH_SIZE = 20  # Sampled pubkeys per subscription, one filter each
+PUBKEY_LINE_LENGTH = 65  # 64 hex characters and a newline
 
 def parse_arguments():
     """Parse command line arguments"""
@@ -38,55 +40,118 @@ def check_file_growth():
     
     return stats
 
-def verify_event_sync(pubkey):
-    """Check if events from a pubkey exist on both relays"""
-    results = {"source": 0, "destination": 0, "matching": 0}
+def sample_pubkeys(sample_size):
+    """Pick random pubkeys from matching_nhex.txt without loading every line"""
+    if os.path.getsize(MATCHING_NHEX_FILE) == 0:
+        return []
+    
+    with open(MATCHING_NHEX_FILE, "rb") as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # The file is written one fixed-width pubkey per line, so lines can be picked by offset
+        if len(mm) % PUBKEY_LINE_LENGTH == 0:
+            line_count = len(mm) // PUBKEY_LINE_LENGTH
+            offsets = [index * PUBKEY_LINE_LENGTH
+                       for index in random.sample(range(line_count), min(sample_size, line_count))]
+            if all(mm[offset + PUBKEY_LINE_LENGTH - 1] == ord("\n") for offset in offsets):
+                return [mm[offset:offset + PUBKEY_LINE_LENGTH - 1].decode() for offset in offsets]
+        
+        # Otherwise fall back to a single pass reservoir sample
+        sample = []
+        for index, line in enumerate(iter(mm.readline, b"")):
+            if index < sample_size:
+                sample.append(line)
+            else:
+                slot = random.randint(0, index)
+                if slot < sample_size:
+                    sample[slot] = line
+        return [line.decode().strip() for line in sample]
+
+def verify_event_sync(pubkeys, on_checked=None):
+    """Check if events from the sampled pubkeys exist on both relays.
+
+    Pubkeys are split into batches of CHECK_BATCH_SIZE and every batch is requested at
+    once on a single connection per relay, each under its own subscription id.
+    on_checked is called with the batch size as each batch finishes. A batch either relay
+    answers with CLOSED is not checked; its pubkeys carry the relay and reason in "refused".
+    """
+    results = {pubkey: {"source": 0, "destination": 0, "matching": 0, "refused": ""} for pubkey in pubkeys}
+    refused = {}  # sub_id -> relay URL and CLOSED reason
+    batches = {
+        f"check_{start // CHECK_BATCH_SIZE}": pubkeys[start:start + CHECK_BATCH_SIZE]
+        for start in range(0, len(pubkeys), CHECK_BATCH_SIZE)
+    }
     
     try:
         # Check source relay with timeout
-        ws_source = create_connection(RELAY_URL, timeout=10)
-        source_events = set()
+        ws_source = DEFAULT_POOL.acquire(RELAY_URL)
+        source_events = {pubkey: set() for pubkey in pubkeys}
         
-        request = json.dumps(["REQ", "source_check", {
-            "authors": [pubkey],
-            "limit": 10
-        }])
-        ws_source.send(request)
+        # One filter per pubkey so each keeps its own limit
+        for sub_id, batch in batches.items():
+            ws_source.send(json_dumps([
+                "REQ", sub_id
+            ] + [{"authors": [pubkey], "limit": 10} for pubkey in batch]))
         
+        outstanding = set(batches)
         timeout = time.time() + 10  # 10 second timeout
-        while time.time() < timeout:
+        while outstanding and time.time() < timeout:
             response = ws_source.recv()
-            data = json.loads(response)
+            data = json_loads(response)
             if data[0] == "EOSE":
-                break
-            if data[0] == "EVENT":
-                source_events.add(data[2]["id"])
+                outstanding.discard(data[1])
+            elif data[0] == "CLOSED" and data[1] in outstanding:
+                outstanding.discard(data[1])
+                refused[data[1]] = f"{RELAY_URL}: {data[2] if len(data) > 2 else ''}"
+            elif data[0] == "EVENT" and data[2]["pubkey"] in source_events:
+                # Raw 32-byte ids hash faster and take half the memory of hex strings
+                source_events[data[2]["pubkey"]].add(bytes.fromhex(data[2]["id"]))
         
-        ws_source.close()
-        results["source"] = len(source_events)
+        for sub_id in batches:
+            ws_source.send(json_dumps(["CLOSE", sub_id]))
+        DEFAULT_POOL.release(RELAY_URL, ws_source)
         
-        # Check destination relay with timeout
-        if source_events:
-            ws_dest = create_connection(NEWS_URL, timeout=10)
-            dest_events = set()
-            
-            request = json.dumps(["REQ", "dest_check", {
-                "ids": list(source_events)
-            }])
-            ws_dest.send(request)
-            
+        # Check destination relay with timeout, one id lookup per batch
+        dest_events = set()
+        outstanding = set()
+        ws_dest = None
+        for sub_id, batch in batches.items():
+            batch_events = set().union(*(source_events[pubkey] for pubkey in batch))
+            if not batch_events or sub_id in refused:
+                if on_checked:
+                    on_checked(len(batch))
+                continue
+            if ws_dest is None:
+                ws_dest = DEFAULT_POOL.acquire(NEWS_URL)
+            ws_dest.send(json_dumps(["REQ", sub_id, {
+                "ids": [event_id.hex() for event_id in batch_events]
+            }]))
+            outstanding.add(sub_id)
+        
+        if ws_dest is not None:
+            requested = set(outstanding)
             timeout = time.time() + 10
-            while time.time() < timeout:
+            while outstanding and time.time() < timeout:
                 response = ws_dest.recv()
-                data = json.loads(response)
-                if data[0] == "EOSE":
-                    break
-                if data[0] == "EVENT":
-                    dest_events.add(data[2]["id"])
+                data = json_loads(response)
+                if data[0] in ("EOSE", "CLOSED") and data[1] in outstanding:
+                    outstanding.discard(data[1])
+                    if data[0] == "CLOSED":
+                        refused[data[1]] = f"{NEWS_URL}: {data[2] if len(data) > 2 else ''}"
+                    if on_checked:
+                        on_checked(len(batches[data[1]]))
+                elif data[0] == "EVENT":
+                    dest_events.add(bytes.fromhex(data[2]["id"]))
             
-            ws_dest.close()
-            results["destination"] = len(dest_events)
-            results["matching"] = len(source_events.intersection(dest_events))
+            for sub_id in requested:
+                ws_dest.send(json_dumps(["CLOSE", sub_id]))
+            DEFAULT_POOL.release(NEWS_URL, ws_dest)
+        
+        for pubkey, events in source_events.items():
+            matching = len(events.intersection(dest_events))
+            results[pubkey] = {"source": len(events), "destination": matching, "matching": matching, "refused": ""}
+        for sub_id, reason in refused.items():
+            for pubkey in batches[sub_id]:
+                results[pubkey]["refused"] = reason
             
     except Exception as e:
         error_msg = str(e)
@@ -109,42 +174,43 @@ def main():
     total_users = file_stats['line_count']
     
     # Sample random pubkeys for verification
-    with open(MATCHING_NHEX_FILE, "r") as file:
-        pubkeys = file.readlines()
-    
-    sample_size = min(100, len(pubkeys))
-    sample_pubkeys = random.sample(pubkeys, sample_size)
+    sample = sample_pubkeys(100)
+    sample_size = len(sample)
     
     # Always show progress bar, but with different formats for interactive/non-interactive
     if is_interactive:
-        progress_bar = tqdm(sample_pubkeys, desc="Checking pubkeys", 
+        progress_bar = tqdm(total=sample_size, desc="Checking pubkeys", 
                           bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}')
     else:
-        progress_bar = tqdm(sample_pubkeys, desc="Progress", 
+        progress_bar = tqdm(total=sample_size, desc="Progress", 
                           bar_format='{percentage:3.0f}% |{bar}| {n_fmt}/{total_fmt}')
     
     missing_events = []
+    refused_checks = []
     successful_checks = 0
     
-    for pubkey in progress_bar:
-        pubkey = pubkey.strip()
-        results = verify_event_sync(pubkey)
-        
-        if "error" in results:
-            if is_interactive:
-                print(f"\nError: {results['error']}")
-            else:
-                print(f"ERROR:{results['error']}")
-            break  # Stop checking if a relay is offline
-        elif results["matching"] == results["source"]:
-            successful_checks += 1
+    all_results = verify_event_sync(sample, progress_bar.update)
+    
+    if "error" in all_results:
+        if is_interactive:
+            print(f"\nError: {all_results['error']}")
         else:
-            missing_events.append({
-                "pubkey": pubkey,
-                "source": results["source"],
-                "destination": results["destination"],
-                "matching": results["matching"]
-            })
+            print(f"ERROR:{all_results['error']}")
+    else:
+        for pubkey, results in all_results.items():
+            if results["refused"]:
+                refused_checks.append({"pubkey": pubkey, "reason": results["refused"]})
+            elif results["matching"] == results["source"]:
+                successful_checks += 1
+            else:
+                missing_events.append({
+                    "pubkey": pubkey,
+                    "source": results["source"],
+                    "destination": results["destination"],
+                    "matching": results["matching"]
+                })
+    
+    progress_bar.close()
     
     # Update the final output section
     duration = time.time() - start_time
@@ -162,6 +228,11 @@ def main():
                 print(f"Source events: {event['source']}")
                 print(f"Destination events: {event['destination']}")
                 print(f"Matching events: {event['matching']}")
+        
+        if refused_checks:
+            print("\nChecks Refused by Relay:")
+            for check in refused_checks:
+                print(f"Pubkey: {check['pubkey'][:8]}... ({check['reason']})")
     else:
         # Simple output for non-interactive mode
         print(f"- Number of Mastodon users fetched: {total_users}")
@@ -169,6 +240,8 @@ def main():
         print(f"- Duration: {duration:.1f} seconds")
         if missing_events:
             print(f"SYNC_MISSING:{len(missing_events)}/{sample_size}")
+        if refused_checks:
+            print(f"SYNC_REFUSED:{len(refused_checks)}/{sample_size}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
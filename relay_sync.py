@@ -1,14 +1,198 @@
 import json
 from datetime import datetime, timezone
 from websocket import create_connection, WebSocket
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Deque, Callable, Tuple, Set, Iterable, Iterator
+from collections import deque
+from queue import Queue, Empty
+import threading
 import os
 import sys
 import time
 import socket
+import select
+import atexit
+import operator
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj: Any) -> bytes:
+        """Serialize obj to compact UTF-8 JSON bytes, matching orjson.dumps"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+# With msgspec installed, EVENT frames are decoded straight into Event structs, which
+# keep only the NIP-01 fields and serialize back without an intermediate dict
+try:
+    import msgspec
+
+    class Event(msgspec.Struct):
+        pubkey: str
+        kind: int
+        content: str
+        created_at: int
+        tags: List[List[Any]]
+        sig: str
+        id: str
+
+        def __getitem__(self, field: str) -> Any:
+            # Lets decoded events stand in for the event dicts used throughout this module
+            return getattr(self, field)
+
+    _event_frame_decoder = msgspec.json.Decoder(Tuple[str, str, Event])
+    _event_encoder = msgspec.json.Encoder()
+except ImportError:
+    msgspec = None
+
+# Applied before connect so the larger buffers take part in TCP window scaling.
+# websocket-client sets TCP_NODELAY by default as well; it is listed so it never silently goes away.
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20),
+    (socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+# A relay that vanishes without closing the connection is noticed within about 30 seconds
+# by the kernel, instead of after the operation timeout. These options are Linux only.
+KEEPALIVE_OPTIONS = {"TCP_KEEPIDLE": 15, "TCP_KEEPINTVL": 5, "TCP_KEEPCNT": 3, "TCP_USER_TIMEOUT": 20000}
+SOCKET_OPTIONS += [(socket.IPPROTO_TCP, getattr(socket, name), value)
+                   for name, value in KEEPALIVE_OPTIONS.items() if hasattr(socket, name)]
+
+# The NIP-01 fields of a signed event, all that is forwarded when publishing
+EVENT_FIELDS = ("pubkey", "kind", "content", "created_at", "tags", "sig", "id")
+EVENT_FRAME_PREFIX = b'["EVENT",'
+REQ_TEMPLATE = b'["REQ","%s",%s]'
+CLOSE_TEMPLATE = b'["CLOSE","%s"]'
+MAX_LIMIT_CLOSES = 6  # Limit-type CLOSED frames in a row before a fetch attempt gives up
+_event_values = operator.itemgetter(*EVENT_FIELDS)
+
+def decode_event_frame(frame: bytes) -> Any:
+    """Parse an EVENT frame into its type, subscription id and event"""
+    if msgspec is not None:
+        try:
+            return _event_frame_decoder.decode(frame)
+        except msgspec.ValidationError:
+            # An event of an unexpected shape, left to the relay it is published to
+            pass
+    return json_loads(frame)
+
+def event_frame(event: Dict[str, Any]) -> bytes:
+    """Serialize a fetched event as an EVENT frame, without rebuilding it unless the relay added fields"""
+    if not isinstance(event, dict):
+        return EVENT_FRAME_PREFIX + _event_encoder.encode(event) + b"]"
+    if len(event) != len(EVENT_FIELDS):
+        event = dict(zip(EVENT_FIELDS, _event_values(event)))
+    return EVENT_FRAME_PREFIX + json_dumps(event) + b"]"
+
+def frame_type(frame: bytes) -> str:
+    """
+    Return the message type of a relay frame ("EVENT", "EOSE", "OK", ...).
+    Relays send compact JSON, so the type is read straight off the first string
+    and frames a caller ignores are never parsed; anything else is parsed in full.
+    """
+    if frame.startswith(b'["'):
+        end = frame.find(b'"', 2)
+        if end != -1:
+            return frame[2:end].decode()
+    return json_loads(frame)[0]
+
+def is_limit_reason(reason: str) -> bool:
+    """Check whether a CLOSED reason says a relay limit was hit, as opposed to a refusal of the request itself"""
+    return reason.startswith("rate-limited:") or "too many" in reason.lower()
+
+def open_connection(url: str, timeout: Optional[float] = None, multithread: bool = False) -> WebSocket:
+    """
+    Open a websocket to a relay with the tuned SOCKET_OPTIONS.
+
+    websocket-client checks every text frame byte by byte in Python unless
+    wsaccel is installed. Payloads are decoded by str.decode or the JSON
+    parser, which reject invalid UTF-8 anyway, so that check is skipped.
+
+    The per-frame send/recv locks are disabled unless multithread is set.
+    That is only safe while one thread at a time uses the connection:
+    recv answers relay PINGs with a PONG send, so a connection read on one
+    thread and written on another needs multithread=True, or a PONG can
+    interleave with an EVENT frame being sent.
+
+    permessage-deflate is deliberately not requested: websocket-client
+    cannot inflate compressed frames and fails on the first one a relay
+    sends after accepting the extension.
+    """
+    return create_connection(url, timeout=timeout, sockopt=SOCKET_OPTIONS,
+                             skip_utf8_validation=True, enable_multithread=multithread)
+
+class ConnectionPool:
+    def __init__(self, idle_timeout: int = 3600, ping_interval: int = 30):
+        """
+        Cache of open websocket connections keyed by relay URL, so syncers
+        running in the same process reuse connections instead of repeating
+        the TCP/TLS/websocket handshake for every relay. Several idle
+        connections can be kept per relay when syncers run side by side.
+
+        Args:
+            idle_timeout: Seconds after which an unused connection is dropped
+            ping_interval: Idle seconds after which a connection is pinged before reuse
+        """
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._connections: Dict[str, List[Tuple[WebSocket, float]]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> WebSocket:
+        """Take a live connection for url out of the pool, or open a new one"""
+        while True:
+            with self._lock:
+                idle_connections = self._connections.get(url)
+                if not idle_connections:
+                    break
+                ws, last_used = idle_connections.pop()
+
+            idle = time.monotonic() - last_used
+            if ws.connected and idle < self.idle_timeout:
+                try:
+                    if idle >= self.ping_interval:
+                        ws.ping()
+                    return ws
+                except Exception:
+                    pass
+            self._close(ws)
+
+        return open_connection(url, timeout=10)
+
+    def release(self, url: str, ws: Optional[WebSocket]) -> None:
+        """Hand a connection back to the pool for later reuse"""
+        if ws is None or not ws.connected:
+            return
+        with self._lock:
+            self._connections.setdefault(url, []).append((ws, time.monotonic()))
+
+    def close_all(self) -> None:
+        """Close every pooled connection"""
+        with self._lock:
+            entries = [entry for idle_connections in self._connections.values() for entry in idle_connections]
+            self._connections.clear()
+        for ws, _ in entries:
+            self._close(ws)
+
+    def _close(self, ws: WebSocket) -> None:
+        try:
+            ws.close()
+        except:
+            pass
+
+DEFAULT_POOL = ConnectionPool()
+atexit.register(DEFAULT_POOL.close_all)
 
 class RelaySyncer:
-    def __init__(self, input_relay: str, output_relay: str, timestamp_file: Optional[str] = None, quiet_mode: bool = False):
+    def __init__(self, input_relay: str, output_relay: str, timestamp_file: Optional[str] = None, quiet_mode: bool = False,
+                 pipeline_depth: int = 16, publish_queue_size: int = 256, pool: Optional[ConnectionPool] = None,
+                 publish_batch_size: int = 128, authors_per_request: int = 100, kinds: Optional[List[int]] = None,
+                 skip_existing: bool = False, filters_per_request: int = 10, publish_window: int = 64,
+                 filter_limit: int = 500):
         """
         Initialize the syncer with configuration
 
@@ -17,14 +201,44 @@ class RelaySyncer:
             output_relay: Output relay URL to publish to
             timestamp_file: File to store last run timestamp (absolute path)
             quiet_mode: Whether to suppress progress output
+            pipeline_depth: Number of concurrent subscriptions kept open on the input relay
+            publish_queue_size: Maximum number of fetched events waiting to be published
+            pool: Connection pool to take relay connections from (shared DEFAULT_POOL if omitted)
+            publish_batch_size: Number of queued events handed to the output relay at a time
+            authors_per_request: Pubkeys combined into one subscription filter for incremental runs
+            kinds: Event kinds to request, so the relay filters them out; all kinds if omitted
+            skip_existing: Ask the output relay which events of each batch it already has and skip those
+            filters_per_request: Single-author filters combined into one subscription for full backfills
+            publish_window: Number of published events that may be waiting for their OK at once.
+                Only one batch is published at a time, so this limits anything only while it is
+                smaller than publish_batch_size
+            filter_limit: Result cap requested for multi-author filters; pubkeys of a subscription
+                that reaches it are fetched again with a filter each
         """
         self.input_relay = input_relay
         self.output_relay = output_relay
         self.timestamp_file = timestamp_file
+        # Ids of events the next run would otherwise fetch and publish a second time
+        self.recent_ids_file = timestamp_file + ".ids" if timestamp_file else None
         self.quiet_mode = quiet_mode
         self.timeout = 30  # Connection timeout in seconds
         self.input_ws: Optional[WebSocket] = None
         self.output_ws: Optional[WebSocket] = None
+        self.pipeline_depth = pipeline_depth
+        self.publish_queue_size = publish_queue_size
+        self.pool = pool or DEFAULT_POOL
+        self.publish_batch_size = publish_batch_size
+        self.authors_per_request = authors_per_request
+        self.kinds = kinds
+        self.skip_existing = skip_existing
+        self.filters_per_request = filters_per_request
+        self.publish_window = publish_window
+        self.filter_limit = filter_limit
+        self._next_sub_id = 0
+        self._timestamp_dir_ready = False  # Set once the state files' directory is known to exist
+        self.pubkey_count = 0  # Pubkeys consumed by the last fetch_and_publish_events call
+        self.completed_subscriptions = 0  # Subscriptions finished by the last fetch_and_publish_events call
+        self._published_ids: Set[str] = set()  # Ids the output relay accepted or already had this run
 
     def _log(self, message: str) -> None:
         """Internal method for logging messages"""
@@ -53,20 +267,80 @@ class RelaySyncer:
             self._log(f"Warning: Error reading {self.timestamp_file}: {e}")
             return None
 
-    def _save_current_timestamp(self) -> None:
-        """Internal method to save the current timestamp for future runs"""
+    def _write_state_file(self, path: str, data: bytes) -> None:
+        """
+        Internal method to replace a state file next to timestamp_file.
+        Written to a temporary file and renamed into place, so an interrupted
+        write never leaves a truncated file behind.
+
+        Args:
+            path: File to write
+            data: Full new contents of the file
+        """
+        if not self._timestamp_dir_ready:
+            # A bare file name lives in the working directory, which already exists
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._timestamp_dir_ready = True
+
+        temp_file = path + ".tmp"
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.replace(temp_file, path)
+
+    def _save_timestamp(self, timestamp: int) -> None:
+        """
+        Internal method to save the timestamp the next run fetches from
+
+        Args:
+            timestamp: Unix timestamp to save
+        """
         if not self.timestamp_file:
             return
 
         try:
-            os.makedirs(os.path.dirname(self.timestamp_file), exist_ok=True)
-
-            current_time = int(datetime.now(timezone.utc).timestamp())
-            with open(self.timestamp_file, "w") as file:
-                file.write(str(current_time))
+            self._write_state_file(self.timestamp_file, str(timestamp).encode())
         except IOError as e:
             self._log(f"Error saving timestamp: {e}")
 
+    def _load_recent_ids(self) -> Set[str]:
+        """
+        Internal method to read the ids saved by _save_recent_ids
+
+        Returns:
+            Set of event ids the last run already published
+        """
+        if not self.recent_ids_file or not os.path.exists(self.recent_ids_file):
+            return set()
+
+        try:
+            with open(self.recent_ids_file, "r") as file:
+                return set(file.read().split())
+        except IOError as e:
+            self._log(f"Warning: Error reading {self.recent_ids_file}: {e}")
+            return set()
+
+    def _save_recent_ids(self, event_ids: List[str]) -> None:
+        """
+        Internal method to save the ids of published events created at or after
+        the saved timestamp. The next run fetches from that timestamp and gets
+        exactly these events again, so it can skip them.
+
+        Args:
+            event_ids: Hex ids of the events to skip next run
+        """
+        if not self.recent_ids_file:
+            return
+
+        try:
+            self._write_state_file(self.recent_ids_file, "\n".join(event_ids).encode())
+        except IOError as e:
+            self._log(f"Error saving published event ids: {e}")
+
     def _is_connection_closed(self, ws: Optional[WebSocket]) -> bool:
         """Check if a websocket connection is closed or None"""
         return ws is None or not ws.connected
@@ -80,8 +354,7 @@ class RelaySyncer:
             except:
                 pass
             try:
-                # Set shorter timeouts for initial connection
-                return create_connection(url, timeout=10)
+                return self.pool.acquire(url)
             except Exception as e:
                 raise ConnectionError(f"Failed to connect to {url}: {e}")
         return ws
@@ -150,87 +423,275 @@ class RelaySyncer:
 
         return None  # Operation failed after all retries
 
-    def _fetch_operation(self, ws: WebSocket, pubkey: str, since: Optional[int]) -> List[Dict[str, Any]]:
+    def _recv_frames(self, ws: WebSocket) -> Iterator[Any]:
         """
-        Internal method to perform the actual fetch operation on a websocket
+        Internal method that blocks for one frame, then keeps yielding frames for
+        as long as they can be read without waiting, so a burst is handled in one
+        pass. Callers stop iterating once they have what they need.
+
+        Frames are yielded as the raw payload bytes, which json_loads parses
+        directly, rather than first being decoded into a str by ws.recv().
+
+        Args:
+            ws: WebSocket connection to read from
+
+        Returns:
+            Iterator of raw frame payloads in arrival order
+        """
+        recv_data = ws.recv_data
+        yield recv_data()[1]
+        while self._frame_ready(ws):
+            yield recv_data()[1]
+
+    def _multiplexed_fetch_operation(self, ws: WebSocket, source: Iterator[str], retry_queue: Deque[str],
+                                     refused: Set[str], since: Optional[int],
+                                     on_event: Callable[[Dict[str, Any]], None]) -> bool:
+        """
+        Internal method to fetch events for many pubkeys over a single websocket.
+        Keeps up to pipeline_depth subscriptions in flight, each with its own id,
+        and refills the window as soon as a subscription reaches EOSE. Events are
+        handed on as they arrive rather than collected per subscription.
+
+        With a since timestamp each subscription covers up to authors_per_request
+        pubkeys in one filter, capped at filter_limit results. A subscription that
+        returns that many may have been cut short, so its pubkeys are requested again
+        the way full backfills request them: each pubkey gets a filter of its own, so a
+        relay's per-filter result cap cannot cut one author's history short for another,
+        and up to filters_per_request of those filters go in one subscription.
+
+        A subscription closed over a relay limit is requested again after a
+        backoff, with fewer subscriptions in flight; one refused for any other
+        reason leaves its pubkeys in refused.
 
         Args:
             ws: WebSocket connection to use
-            pubkey: Public key to fetch events for
+            source: Iterator of pubkeys, consumed lazily as the window has room
+            retry_queue: Pubkeys from a failed attempt, fetched before new ones from source
+            refused: Pubkeys the relay closed a subscription for, so they were not fetched
             since: Optional timestamp to fetch events since
+            on_event: Called with each event as soon as it is received
 
         Returns:
-            List of events fetched
+            True once every pubkey has been fetched
         """
-        events = []
-        request = {"authors": [pubkey]}
+        pending: Dict[str, List[Any]] = {}  # sub_id -> [event count per pubkey, pubkeys, one filter per pubkey]
+        split_queue: Deque[str] = deque()  # Pubkeys whose shared filter hit filter_limit
+        # Everything but the authors is the same for every subscription of this run
+        base_filter: Dict[str, Any] = {}
+        if self.kinds:
+            base_filter["kinds"] = self.kinds
         if since is not None:
-            request["since"] = since
+            base_filter["since"] = since
+
+        def submit() -> bool:
+            split = since is None or bool(split_queue)
+            authors = []
+            if split_queue:
+                while split_queue and len(authors) < self.filters_per_request:
+                    authors.append(split_queue.popleft())
+            else:
+                authors_per_request = self.filters_per_request if split else self.authors_per_request
+                while len(authors) < authors_per_request:
+                    if retry_queue:
+                        authors.append(retry_queue.popleft())
+                        continue
+                    pubkey = next(source, None)
+                    if pubkey is None:
+                        break
+                    self.pubkey_count += 1
+                    authors.append(pubkey)
+            if not authors:
+                return False
+            sub_id = f"s{self._next_sub_id}"
+            self._next_sub_id += 1
+            if split:
+                filters = [dict(base_filter, authors=[pubkey]) for pubkey in authors]
+            else:
+                filters = [dict(base_filter, authors=authors, limit=self.filter_limit)]
+            pending[sub_id] = [{}, authors, split]
+            ws.send(REQ_TEMPLATE % (sub_id.encode(), b",".join(map(json_dumps, filters))))
+            return True
+
+        # Shrinks when the relay refuses subscriptions beyond its own concurrency limit, and
+        # grows back by one after every window's worth of subscriptions completing normally
+        window = self.pipeline_depth
+        completed_in_window = 0
+        limit_closes = 0  # Limit-type CLOSED frames since a subscription last completed
+
+        try:
+            while len(pending) < window and submit():
+                pass
 
-        ws.send(json.dumps(["REQ", "unique_subscription_id", request]))
+            while pending:
+                for response in self._recv_frames(ws):
+                    message_type = frame_type(response)
+                    if message_type == "EVENT":
+                        data = decode_event_frame(response)
+                        bucket = pending.get(data[1])
+                        if bucket is not None:
+                            event = data[2]
+                            event_counts = bucket[0]
+                            event_counts[event["pubkey"]] = event_counts.get(event["pubkey"], 0) + 1
+                            on_event(event)
+                    elif message_type in ("EOSE", "CLOSED"):
+                        data = json_loads(response)
+                        bucket = pending.pop(data[1], None)
+                        if bucket is None:
+                            continue
+                        reason = data[2] if len(data) > 2 else ""
+                        if message_type == "EOSE":
+                            # Relays keep subscriptions open after EOSE and cap how many a connection may hold
+                            ws.send(CLOSE_TEMPLATE % data[1].encode())
+                            if not bucket[2] and sum(bucket[0].values()) >= self.filter_limit:
+                                self._debug(f"Subscription for {len(bucket[1])} pubkeys reached its limit, "
+                                            f"fetching them one filter each")
+                                split_queue.extend(bucket[1])
+                            self.completed_subscriptions += 1
+                            completed_in_window += 1
+                            limit_closes = 0
+                            if window < self.pipeline_depth and completed_in_window >= window:
+                                window += 1
+                                completed_in_window = 0
+                        elif is_limit_reason(reason):
+                            # Over the relay's subscription or rate limit: run fewer at once,
+                            # back off and request these pubkeys again
+                            retry_queue.extend(bucket[1])
+                            limit_closes += 1
+                            if limit_closes >= MAX_LIMIT_CLOSES:
+                                raise ConnectionError(f"Relay keeps closing subscriptions: {reason}")
+                            window = max(1, len(pending))
+                            completed_in_window = 0
+                            delay = min(2 ** (limit_closes - 1), 30)
+                            self._debug(f"Subscription closed by relay: {reason}, "
+                                        f"keeping {window} in flight, retrying in {delay}s")
+                            time.sleep(delay)
+                        else:
+                            # Refused for these pubkeys themselves (blocked, restricted, error);
+                            # kept so the run is not recorded as complete
+                            self.completed_subscriptions += 1
+                            refused.update(bucket[1])
+                            self._log(f"Subscription for {len(bucket[1])} pubkeys closed by relay: {reason}")
+                        for pubkey, event_count in bucket[0].items():
+                            self._debug(f"Fetched {event_count} events for {pubkey}")
+                        while len(pending) < window and submit():
+                            pass
+                        if not pending:
+                            break
+        except Exception:
+            # Put in-flight pubkeys back so a retry fetches them again
+            retry_queue.extendleft(pubkey for bucket in pending.values() for pubkey in bucket[1])
+            retry_queue.extendleft(split_queue)
+            raise
 
-        while True:
-            response = ws.recv()
-            data = json.loads(response)
-            if data[0] == "EOSE":
-                break
-            if data[0] == "EVENT":
-                events.append(data[2])
+        return True
 
-        if events:
-            self._debug(f"Fetched {len(events)} events for {pubkey}")
-        return events
+    def _frame_ready(self, ws: WebSocket) -> bool:
+        """Check whether a frame can be read from ws without blocking"""
+        sock = ws.sock
+        # TLS sockets can hold decrypted records select() does not report
+        return bool(getattr(sock, "pending", lambda: 0)() or select.select([sock], [], [], 0)[0])
 
-    def _publish_operation(self, ws: WebSocket, event: Dict[str, Any]) -> bool:
+    def _read_oks(self, ws: WebSocket, in_flight: Set[str], unacked: Set[str], accepted: List[int]) -> None:
         """
-        Internal method to perform the actual publish operation on a websocket
+        Internal method to read one burst of frames and settle the OK responses in it
 
         Args:
             ws: WebSocket connection to use
-            event: Event to publish
+            in_flight: Ids sent on ws and not answered yet, removed as their OK arrives
+            unacked: Ids of the batch without an OK yet, shared between attempts
+            accepted: Single-item list counting accepted events, kept across retries
+        """
+        for response in self._recv_frames(ws):
+            if frame_type(response) != "OK":
+                continue
+            response_data = json_loads(response)
+            if response_data[1] not in in_flight:
+                continue
+            in_flight.discard(response_data[1])
+            unacked.discard(response_data[1])
+            if response_data[2] == True:
+                accepted[0] += 1
+                self._published_ids.add(response_data[1])
+            else:
+                self._log(f"Failed to publish event {response_data[1]}. Response: {response_data}")
+
+    def _existing_ids(self, ws: WebSocket, ids: Set[str]) -> Set[str]:
+        """
+        Internal method to look up which events the output relay already stores
 
-        Returns:
-            True if publish was successful
-        """
-        request = json.dumps(["EVENT", {
-            "pubkey": event["pubkey"],
-            "kind": event["kind"],
-            "content": event["content"],
-            "created_at": event["created_at"],
-            "tags": event["tags"],
-            "sig": event["sig"],
-            "id": event["id"]
-        }])
-
-        ws.send(request)
-        response = ws.recv()
-        response_data = json.loads(response)
-
-        if response_data[2] != True:
-            raise Exception(f"Failed to publish. Response: {response_data}")
-        return True
+        Args:
+            ws: WebSocket connection to the output relay
+            ids: Ids of the events about to be published
 
-    def _fetch_events_for_pubkey(self, pubkey: str, since: Optional[int]) -> List[Dict[str, Any]]:
+        Returns:
+            Subset of ids the relay returned events for, empty if it answered with a NOTICE
         """
-        Internal method to fetch events for a single pubkey
+        existing = set()
+        ws.send(REQ_TEMPLATE % (b"existing", json_dumps({"ids": list(ids)})))
+        done = False
+        while not done:
+            for response in self._recv_frames(ws):
+                message_type = frame_type(response)
+                if message_type == "NOTICE":
+                    # Typically the relay rejecting the ids filter (too many ids) without a CLOSED;
+                    # nothing is known then, so the whole batch gets published
+                    self._debug(f"Skipping the lookup of existing events: {json_loads(response)[1:]}")
+                    return set()
+                if message_type not in ("EVENT", "EOSE", "CLOSED"):
+                    continue
+                data = json_loads(response)
+                if message_type == "EVENT" and data[1] == "existing":
+                    existing.add(data[2]["id"])
+                elif message_type != "EVENT" and data[1] == "existing":
+                    if message_type == "EOSE":
+                        ws.send(CLOSE_TEMPLATE % b"existing")
+                    done = True
+                    break
+        return existing
+
+    def _publish_batch_operation(self, ws: WebSocket, events: List[Dict[str, Any]],
+                                 unacked: Set[str], accepted: List[int]) -> int:
+        """
+        Internal method to publish a batch over a sliding window: up to
+        publish_window events are awaiting an OK at any time, and OKs that are
+        already waiting are read between sends, so the relay never sits idle
+        while a full window drains. Only events still waiting for an OK are
+        sent, so a retry after a dropped connection does not resend what the
+        relay already answered.
 
         Args:
-            pubkey: Public key to fetch events for
-            since: Optional timestamp to fetch events since
+            ws: WebSocket connection to use
+            events: Events to publish
+            unacked: Ids of the events without an OK yet, shared between attempts
+            accepted: Single-item list counting accepted events, kept across retries
 
         Returns:
-            List of events
+            Number of events the relay accepted
         """
-        return self._with_retry(
-            operation_name=f"fetch events for {pubkey}",
-            operation=lambda ws: self._fetch_operation(ws, pubkey, since),
-            is_input_relay=True,
-            base_timeout=15
-        ) or []
+        if self.skip_existing and unacked:
+            existing = self._existing_ids(ws, unacked)
+            if existing:
+                self._debug(f"Skipping {len(existing)} events already on {self.output_relay}")
+                unacked.difference_update(existing)
+                self._published_ids.update(existing)
+        in_flight: Set[str] = set()
+        for event in events:
+            if event["id"] not in unacked:
+                continue
+            while len(in_flight) >= self.publish_window:
+                self._read_oks(ws, in_flight, unacked, accepted)
+            ws.send(event_frame(event))
+            in_flight.add(event["id"])
+            if self._frame_ready(ws):
+                self._read_oks(ws, in_flight, unacked, accepted)
+        while in_flight:
+            self._read_oks(ws, in_flight, unacked, accepted)
+        return accepted[0]
 
     def _publish_events(self, events: List[Dict[str, Any]]) -> int:
         """
-        Internal method to publish events to the output relay
+        Internal method to publish events to the output relay in batches of
+        publish_batch_size, each retried on its own
 
         Args:
             events: List of events to publish
@@ -240,42 +701,135 @@ class RelaySyncer:
         """
         successful = 0
 
-        for event in events:
-            if self._with_retry(
-                operation_name=f"publish event {event['id']}",
-                operation=lambda ws: self._publish_operation(ws, event),
+        for start in range(0, len(events), self.publish_batch_size):
+            batch = events[start:start + self.publish_batch_size]
+            unacked = {event["id"] for event in batch}
+            accepted = [0]
+            self._with_retry(
+                operation_name=f"publish {len(batch)} events",
+                operation=lambda ws: self._publish_batch_operation(ws, batch, unacked, accepted),
                 is_input_relay=False,
                 base_timeout=10
-            ):
-                successful += 1
+            )
+            successful += accepted[0]
 
         return successful
 
-    def fetch_and_publish_events(self, pubkeys: List[str]) -> int:
+    def _publisher_loop(self, publish_queue: "Queue[Optional[Dict[str, Any]]]", published: List[int]) -> None:
+        """
+        Internal method run on a background thread that publishes fetched events
+        while the input relay keeps streaming. Whatever is already queued goes out
+        as one pipelined batch. Stops at a None sentinel.
+
+        Args:
+            publish_queue: Queue of events handed over by the fetcher
+            published: Single-item list the number of published events is added to
+        """
+        # Connect to the output relay now, while the fetcher is still handshaking with
+        # the input relay, instead of when the first event arrives
+        try:
+            self.output_ws = self._ensure_connection(self.output_ws, self.output_relay)
+        except ConnectionError as e:
+            self._log(f"Error connecting to {self.output_relay}, retrying on first publish: {e}")
+
+        done = False
+        while not done:
+            event = publish_queue.get()
+            if event is None:
+                return
+            batch = [event]
+            while len(batch) < self.publish_batch_size:
+                try:
+                    event = publish_queue.get_nowait()
+                except Empty:
+                    break
+                if event is None:
+                    done = True
+                    break
+                batch.append(event)
+
+            self._debug(f"Publishing {len(batch)} events to {self.output_relay}...")
+            published[0] += self._publish_events(batch)
+
+    def fetch_and_publish_events(self, pubkeys: Iterable[str]) -> int:
         """
         Fetch events from input relay and publish to output relay.
-        Uses the last run timestamp automatically if a timestamp file is configured.
+        Publishing runs on a background thread so it overlaps with fetching.
+        Uses the last run timestamp automatically if a timestamp file is configured,
+        and saves the start of this run once every pubkey has been fetched, along
+        with the ids of published events created since then.
 
         Args:
-            pubkeys: List of pubkeys to fetch events for
+            pubkeys: Pubkeys to fetch events for, may be a lazy iterator
 
         Returns:
             Number of successfully published events
         """
-        successful_syncs = 0
         since = self._get_last_run_timestamp()
+        # Taken before fetching so events created during the run are picked up next time
+        run_started = int(datetime.now(timezone.utc).timestamp())
+        source = iter(pubkeys)
+        remaining: Deque[str] = deque()
+        refused: Set[str] = set()
+        self.pubkey_count = 0
+        self.completed_subscriptions = 0
+        self._published_ids = set()
+        publish_queue: "Queue[Optional[Dict[str, Any]]]" = Queue(maxsize=self.publish_queue_size)
+        published = [0]
+        seen_ids: Set[str] = set()
+        # Events created since the saved timestamp were published by the last run already
+        published_before = self._load_recent_ids() if since is not None else set()
+        recent_ids: List[str] = []
+
+        def enqueue(event: Dict[str, Any]) -> None:
+            # A retried subscription streams its pubkeys' events again; publish each id once
+            if event["id"] in seen_ids:
+                return
+            seen_ids.add(event["id"])
+            if event["created_at"] >= run_started:
+                recent_ids.append(event["id"])
+            if event["id"] not in published_before:
+                publish_queue.put(event)
 
         if since:
             dt = datetime.fromtimestamp(since, timezone.utc)
             self._debug(f"Fetching events since {dt}")
         self._debug(f"Fetching from {self.input_relay}...")
 
-        for pubkey in pubkeys:
-            events = self._fetch_events_for_pubkey(pubkey, since)
-            if events:
-                self._debug(f"Publishing {len(events)} events for {pubkey} to {self.output_relay}...")
-                successful_syncs += self._publish_events(events)
+        publisher = threading.Thread(target=self._publisher_loop, args=(publish_queue, published), daemon=True)
+        publisher.start()
 
-            self._save_current_timestamp()
-
-        return successful_syncs
\ No newline at end of file
+        try:
+            while True:
+                completed = self.completed_subscriptions
+                if self._with_retry(
+                    operation_name="fetch events",
+                    operation=lambda ws: self._multiplexed_fetch_operation(
+                        ws, source, remaining, refused, since, enqueue
+                    ),
+                    is_input_relay=True,
+                    base_timeout=15
+                ) or self.completed_subscriptions == completed:
+                    break
+                # Subscriptions kept finishing between the failures, so the relay is still
+                # serving: give the rest of the run a fresh retry budget instead of giving up
+                self._debug(f"Fetch failed after {self.completed_subscriptions - completed} subscriptions, retrying")
+        finally:
+            publish_queue.put(None)
+            publisher.join()
+            self.pool.release(self.input_relay, self.input_ws)
+            self.pool.release(self.output_relay, self.output_ws)
+            self.input_ws = None
+            self.output_ws = None
+
+        if remaining or next(source, None) is not None:
+            self._log(f"Gave up on fetching events after {self.pubkey_count} pubkeys")
+        elif refused:
+            self._log(f"Relay refused events for {len(refused)} pubkeys, not saving the timestamp")
+        else:
+            self._save_timestamp(run_started)
+            # Rejected events, and those lost when a publish batch gave up, are left for the next run
+            self._save_recent_ids([event_id for event_id in recent_ids
+                                   if event_id in self._published_ids or event_id in published_before])
+
+        return published[0]
@@ -1,8 +1,12 @@
-import json
 from datetime import datetime, timezone, timedelta
-from websocket import create_connection
+from relay_sync import open_connection, event_frame, json_loads, json_dumps
 import os
 import time
+import heapq
+import itertools
+import atexit
+import threading
+from queue import Queue, Empty
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import argparse
@@ -11,6 +15,11 @@ import argparse
 RELAY_URL = "wss://relay.mostr.pub"
 NEWS_URL = "wss://relay.nos.social"
 
+OK_TIMEOUT = 10  # Seconds to wait for the remaining OK responses after the last publish
+PUBLISH_QUEUE_SIZE = 256  # Events fetched ahead of the publish connection per worker
+SYNC_SAVE_EVERY = 256  # Completed pubkeys between writes of the sync position
+SYNC_SAVE_SECONDS = 1  # Longest time the written sync position may lag behind
+
 # File paths
 MATCHING_NHEX_FILE = "matching_nhex.txt"
 SYNC_POSITION_FILE = "sync_position.txt"
@@ -23,7 +32,8 @@ def parse_arguments():
 def get_pubkeys_from_file():
     if os.path.exists(MATCHING_NHEX_FILE):
         with open(MATCHING_NHEX_FILE, "r") as file:
-            return [line.strip() for line in file if line.strip()]
+            # One read and split instead of a Python-level loop per line
+            return file.read().split()
     return []
 
 def get_sync_position():
@@ -35,44 +45,149 @@ def get_sync_position():
     return 0
 
 def save_sync_position(position):
-    with open(SYNC_POSITION_FILE, "w") as file:
-        file.write(str(position))
+    fd = os.open(SYNC_POSITION_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, str(position).encode())
+    finally:
+        os.close(fd)
 
 def get_24_hours_ago_timestamp():
     return int((datetime.now(timezone.utc) - timedelta(days=1)).timestamp())
 
+def read_publish_responses(ws_publish, responses):
+    """Forward OK frames from the publish connection to a queue until it is closed"""
+    try:
+        while True:
+            data = json_loads(ws_publish.recv_data()[1])
+            if data[0] == "OK":
+                responses.put(data)
+    except Exception:
+        pass
+
+def send_publish_frames(ws_publish, outgoing):
+    """Send queued EVENT frames on the publish connection until a None sentinel arrives"""
+    while True:
+        frame = outgoing.get()
+        try:
+            if frame is None:
+                return
+            ws_publish.send(frame)
+        except Exception:
+            # Unsent events surface as missing OKs; keep draining so nobody waits on the queue
+            pass
+        finally:
+            outgoing.task_done()
+
+# Each worker thread keeps its own pair of connections for every pubkey it handles,
+# so the TCP/TLS/websocket handshakes happen once per thread instead of once per pubkey
+_thread_state = threading.local()
+_open_connections = []
+_open_connections_lock = threading.Lock()
+_subscription_ids = itertools.count()
+
+def _open_tracked(url, multithread=False):
+    ws = open_connection(url, multithread=multithread)
+    with _open_connections_lock:
+        _open_connections.append(ws)
+    return ws
+
+def get_connections():
+    """Return this thread's fetch connection, outgoing EVENT queue and OK queue, reconnecting where needed"""
+    state = _thread_state
+    if getattr(state, "ws_fetch", None) is None or not state.ws_fetch.connected:
+        state.ws_fetch = _open_tracked(RELAY_URL)
+    if getattr(state, "ws_publish", None) is None or not state.ws_publish.connected or not state.reader.is_alive():
+        if getattr(state, "ws_publish", None) is not None:
+            state.ws_publish.abort()
+            state.outgoing.put(None)
+        # Sent on by the sender thread and read by the reader thread, which also sends PONGs
+        state.ws_publish = _open_tracked(NEWS_URL, multithread=True)
+        # Events are sent and OKs collected on threads of their own, so reading the
+        # fetch connection never waits on the publish connection in either direction
+        state.outgoing = Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        state.sender = threading.Thread(target=send_publish_frames, args=(state.ws_publish, state.outgoing), daemon=True)
+        state.sender.start()
+        state.responses = Queue()
+        state.reader = threading.Thread(target=read_publish_responses, args=(state.ws_publish, state.responses), daemon=True)
+        state.reader.start()
+    return state.ws_fetch, state.outgoing, state.responses
+
+def drop_connections():
+    """Close this thread's connections after an error so the next pubkey starts on fresh ones"""
+    state = _thread_state
+    for name in ("ws_fetch", "ws_publish"):
+        ws = getattr(state, name, None)
+        if ws is not None:
+            try:
+                ws.abort()
+                ws.close()
+            except Exception:
+                pass
+            setattr(state, name, None)
+            if name == "ws_publish":
+                state.outgoing.put(None)
+
+def close_connections():
+    with _open_connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+    for ws in connections:
+        try:
+            ws.abort()
+            ws.close()
+        except Exception:
+            pass
+
+atexit.register(close_connections)
+
 def fetch_and_publish_events(pubkey, line_number, last_24_hours):
     try:
-        ws_fetch = create_connection(RELAY_URL)
-        ws_publish = create_connection(NEWS_URL)
+        ws_fetch, outgoing, responses = get_connections()
+        pending_ids = set()
+        # The connection outlives this call, so frames are matched to a subscription id of its own
+        sub_id = f"sync{next(_subscription_ids)}"
 
         # Determine the timestamp for fetching events
         since_timestamp = get_24_hours_ago_timestamp() if last_24_hours else 0
-        request = json.dumps(["REQ", "unique_subscription_id", {"authors": [pubkey], "since": since_timestamp}])
+        request = json_dumps(["REQ", sub_id, {"authors": [pubkey], "since": since_timestamp}])
         ws_fetch.send(request)
         while True:
-            response = ws_fetch.recv()
-            data = json.loads(response)
+            # Raw payload bytes go straight to the parser without a str decode
+            _, response = ws_fetch.recv_data()
+            data = json_loads(response)
+            if len(data) < 2 or data[1] != sub_id:
+                continue
             if data[0] == "EOSE":  # End of subscription events
+                # Relays keep subscriptions open after EOSE
+                ws_fetch.send(json_dumps(["CLOSE", sub_id]))
+                break
+            if data[0] == "CLOSED":
+                print(f"Subscription for pubkey {pubkey} closed by relay: {data[2:]}")
                 break
             if data[0] == "EVENT":
                 event = data[2]
-                publish_request = json.dumps(["EVENT", {
-                    "pubkey": event["pubkey"],
-                    "content": event["content"],
-                    "created_at": event["created_at"],
-                    "id": event["id"]
-                }])
-                ws_publish.send(publish_request)
-                publish_response = ws_publish.recv()
-                publish_response_data = json.loads(publish_response)
-                if publish_response_data[0] != "OK":
-                    print(f"Failed to publish event ID {event['id']}.")
-
-        ws_fetch.close()
-        ws_publish.close()
+                # Forwarded whole: kind, tags and sig are needed for the relay to accept it
+                outgoing.put(event_frame(event))
+                pending_ids.add(event["id"])
+
+        # Every queued event is on the wire before waiting for the last OKs
+        outgoing.join()
+
+        # Match the acknowledgements to the published events by id
+        try:
+            while pending_ids:
+                publish_response_data = responses.get(timeout=OK_TIMEOUT)
+                if publish_response_data[1] in pending_ids:
+                    pending_ids.discard(publish_response_data[1])
+                    if not publish_response_data[2]:
+                        print(f"Failed to publish event ID {publish_response_data[1]}.")
+        except Empty:
+            pass
+        for event_id in pending_ids:
+            print(f"Failed to publish event ID {event_id}.")
     except Exception as e:
         print(f"Error fetching or publishing events for pubkey {pubkey}: {e}")
+        drop_connections()
 
 def main():
     args = parse_arguments()
@@ -91,23 +206,53 @@ def main():
     sync_position = get_sync_position()
     print(f"Starting sync from line {sync_position}.")
 
+    # Positions index the file as written. A pubkey listed more than once is only synced at
+    # its first line; its later lines count as finished straight away.
+    seen_pubkeys = set(pubkeys[:sync_position])
+    line_numbers = []
+    finished_lines = []
+    for line_number in range(sync_position, len(pubkeys)):
+        if pubkeys[line_number] in seen_pubkeys:
+            finished_lines.append(line_number)
+        else:
+            seen_pubkeys.add(pubkeys[line_number])
+            line_numbers.append(line_number)
+    heapq.heapify(finished_lines)
+
     with ThreadPoolExecutor(max_workers=100) as executor:
-        progress_bar = tqdm(total=len(pubkeys) - sync_position, desc="Processing pubkeys", unit="pubkey")
-        futures = {executor.submit(fetch_and_publish_events, pubkeys[i], i, last_24_hours): i for i in range(sync_position, len(pubkeys))}
-        
+        progress_bar = tqdm(total=len(line_numbers), desc="Processing pubkeys", unit="pubkey")
+        futures = {executor.submit(fetch_and_publish_events, pubkeys[i], i, last_24_hours): i for i in line_numbers}
+
+        # Pubkeys finish out of order, so the saved position is the first line not finished yet.
+        # It is written in batches, and once more on exit so an interrupted run resumes there.
+        watermark = [sync_position]
+        unsaved = 0
+        last_saved = time.monotonic()
+        atexit.register(lambda: save_sync_position(watermark[0]))
+
         for future in as_completed(futures):
             line_number = futures[future]
             try:
                 future.result()
-                save_sync_position(line_number + 1)
                 progress_bar.update(1)
             except Exception as e:
                 print(f"Error processing line {line_number}: {e}")
 
+            heapq.heappush(finished_lines, line_number)
+            while finished_lines and finished_lines[0] == watermark[0]:
+                heapq.heappop(finished_lines)
+                watermark[0] += 1
+            unsaved += 1
+            if unsaved >= SYNC_SAVE_EVERY or time.monotonic() - last_saved >= SYNC_SAVE_SECONDS:
+                save_sync_position(watermark[0])
+                unsaved = 0
+                last_saved = time.monotonic()
+
         progress_bar.close()
 
         # Reset to the beginning of the list
         sync_position = 0
+        watermark[0] = sync_position
         save_sync_position(sync_position)
         print("Reached end of pubkey list. Restarting from the top.")
 
@@ -1,58 +1,103 @@
 import os
+import re
+import sys
 import ast
 import importlib.metadata
+from concurrent.futures import ProcessPoolExecutor
+
+PARALLEL_PARSE_THRESHOLD = 32  # Below this many files, starting worker processes costs more than parsing
+
+class ImportCollector(ast.NodeVisitor):
+    """Collects the modules named by import statements in a single pass over the tree."""
+    def __init__(self):
+        self.modules = set()
+
+    def visit_Import(self, node):
+        self.modules.update(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node):
+        # Relative imports ("from . import x") name no module
+        if node.module:
+            self.modules.add(node.module)
 
 def get_imports_from_file(file_path):
     """Extracts all imported modules from a Python file."""
     try:
         with open(file_path, "r") as file:
             node = ast.parse(file.read(), filename=file_path)
-        return {alias.name for n in ast.walk(node) if isinstance(n, ast.Import) for alias in n.names} | \
-               {n.module for n in ast.walk(node) if isinstance(n, ast.ImportFrom) and n.module}
+        collector = ImportCollector()
+        collector.visit(node)
+        return collector.modules
     except (SyntaxError, UnicodeDecodeError) as e:
         print(f"Skipping file {file_path} due to parsing error: {e}")
         return set()
 
 def get_all_imports(directory):
-    """Collects all imports from top-level Python files in a directory."""
+    """Collects the third-party top-level modules imported by top-level Python files in a directory."""
     imports = set()
-    for file in os.listdir(directory):
-        if file.endswith(".py"):
-            file_path = os.path.join(directory, file)
-            if os.path.isfile(file_path):  # Ensure it's a file, not a directory
-                imports.update(get_imports_from_file(file_path))
-    return imports
+    local_modules = set()
+    file_paths = []
+    # Directory entries carry their file type, so no extra stat per file is needed
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".py") and entry.is_file():
+                local_modules.add(entry.name[:-3])
+                file_paths.append(entry.path)
+
+    # Parsing is CPU bound, so large directories are spread over processes rather than threads
+    if len(file_paths) > PARALLEL_PARSE_THRESHOLD:
+        with ProcessPoolExecutor() as executor:
+            for file_imports in executor.map(get_imports_from_file, file_paths, chunksize=8):
+                imports.update(file_imports)
+    else:
+        for file_path in file_paths:
+            imports.update(get_imports_from_file(file_path))
+    # Standard library modules and the scripts importing each other are not requirements
+    return {name.split(".")[0] for name in imports} - sys.stdlib_module_names - local_modules
 
 def get_requirements(requirements_file):
     """Reads the requirements.txt file and returns a set of required packages."""
     with open(requirements_file, "r") as file:
         return {line.strip().split('==')[0] for line in file if line.strip() and not line.startswith('#')}
 
+def get_distribution_names(imports):
+    """Maps imported modules to the names of the installed distributions providing them, e.g. websocket to websocket-client."""
+    package_map = importlib.metadata.packages_distributions()
+    return {package_map.get(imp, [imp])[0] for imp in imports}
+
+def normalize_name(name):
+    """Normalizes a distribution name the way pip compares them, e.g. PyYAML to pyyaml and pydantic_core to pydantic-core."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
 def add_missing_requirements(requirements_file, missing_imports):
     """Appends missing imports with versions to the requirements.txt file."""
+    # One scan of the installed metadata instead of one per package
+    versions = {normalize_name(dist.metadata["Name"]): dist.version for dist in importlib.metadata.distributions()}
+    lines = []
+    for imp in missing_imports:
+        version = versions.get(normalize_name(imp))
+        if version is None:
+            print(f"Warning: {imp} is not installed, adding without version.")
+            lines.append(f"{imp}\n")
+        else:
+            lines.append(f"{imp}=={version}\n")
     with open(requirements_file, "a") as file:
-        for imp in missing_imports:
-            try:
-                # Get the installed version of the package
-                version = importlib.metadata.version(imp)
-                file.write(f"{imp}=={version}\n")
-            except importlib.metadata.PackageNotFoundError:
-                print(f"Warning: {imp} is not installed, adding without version.")
-                file.write(f"{imp}\n")
+        file.write("".join(lines))
     print(f"Added missing imports to {requirements_file}.")
 
 def main():
     directory = '.'  # Directory to search for .py files
     requirements_file = 'requirements.txt'
 
-    # Get all imports from top-level .py files
-    all_imports = get_all_imports(directory)
+    # Get all imports from top-level .py files, by the distribution that provides them
+    all_imports = get_distribution_names(get_all_imports(directory))
 
     # Get all requirements from requirements.txt
     requirements = get_requirements(requirements_file)
 
-    # Find missing imports
-    missing_imports = all_imports - requirements
+    # Find missing imports, comparing names the way pip does so Foo_Bar matches foo-bar
+    required_names = {normalize_name(requirement) for requirement in requirements}
+    missing_imports = {imp for imp in all_imports if normalize_name(imp) not in required_names}
 
     if missing_imports:
         print("The following imports are missing from requirements.txt and will be added:")